@@ -6,142 +6,290 @@
 #   ALLOWED_ORIGINS  (optional, comma-separated origins)
 #
 # Usage (POST JSON):
-#   { "query": "917470558969", "limit": 100, "lang": "en", "type": "json" }
+#   { "query": "917470558969", "limit": 100, "lang": "en" }
+#
+# Responses are always requested from upstream as JSON; a "type" field in
+# the body is ignored. Other upstream formats (csv/xml) would need their
+# own route since summarize() only understands the JSON shape.
 
 import os
-import json
-import textwrap
+import hashlib
+import threading
+import orjson
 import requests
+from cachetools import TTLCache
+from concurrent.futures import ThreadPoolExecutor
 
 API_URL = "https://leakosintapi.com/"
 
+# Environment is fixed for the lifetime of the container, so resolve it once
+# at import time instead of re-reading it on every invocation.
+_TOKEN = os.getenv("LEAK_API_TOKEN")
+_ALLOWED_ORIGIN = (os.getenv("ALLOWED_ORIGINS", "").split(",") or [""])[0].strip() or None
+
+_BASE_HEADERS = {
+    "Content-Type": "application/json",
+    "Access-Control-Allow-Methods": "GET, POST, OPTIONS",
+    "Access-Control-Allow-Headers": "Content-Type, Authorization",
+}
+
+# Fully static responses, prebuilt once so these paths allocate nothing
+# per invocation.
+_PREFLIGHT_RESPONSE = {
+    "statusCode": 200,
+    "headers": {**_BASE_HEADERS, "Access-Control-Allow-Origin": "*"},
+    "body": '{"ok":true}',
+}
+_MISCONFIG_RESPONSE = {
+    "statusCode": 500,
+    "headers": {**_BASE_HEADERS, "Access-Control-Allow-Origin": _ALLOWED_ORIGIN or "*"},
+    "body": '{"error":"Server misconfiguration: missing LEAK_API_TOKEN"}',
+}
+
+# Module-level session so warm invocations reuse pooled keep-alive
+# connections to the upstream host instead of paying a fresh TCP + TLS
+# handshake per request.
+SESSION = requests.Session()
+SESSION.mount("https://", requests.adapters.HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=requests.adapters.Retry(total=3, backoff_factor=0.3, status_forcelist=[502, 503, 504]),
+))
+SESSION.headers["Connection"] = "keep-alive"
+
+# Upstream responses are stable for minutes and each call is billable, so
+# cache {raw, summary} per (query, limit, lang, type) while the container
+# stays warm. The lock keeps TTLCache safe if the runtime ever reuses the
+# module across threads.
+_CACHE = TTLCache(maxsize=10_000, ttl=300)
+_CACHE_LOCK = threading.Lock()
+
+# Zero-hit upstream answers are stable, so remember them for longer than
+# the regular tier and skip the billable call on repeats.
+_NEGATIVE_CACHE = TTLCache(maxsize=10_000, ttl=3600)
+
+# Canned reply for queries that cannot match anything upstream, shaped like
+# a real zero-hit response so clients and summarize() treat it normally.
+_EMPTY_RESULT = {"List": {}, "NumOfDatabase": 0}
+
+# Fan-out pool for batch requests; bounded so one batch cannot flood the
+# upstream API with concurrent connections.
+_BATCH_POOL = ThreadPoolExecutor(max_workers=8)
+_MAX_BATCH = 20
+
+def _is_trivial(query):
+    """True for inputs that cannot produce upstream matches: shorter than 3
+    chars after stripping, or containing no alphanumeric character at all."""
+    q = query.strip()
+    return len(q) < 3 or not any(c.isalnum() for c in q)
+
+def _cache_key(query, limit, lang):
+    return hashlib.blake2b(f"{query}|{limit}|{lang}".encode(), digest_size=16).hexdigest()
+
+def _cap(s: str, n: int = 2000) -> str:
+    """Cap a string at n chars with a single slice; unlike textwrap.shorten
+    this does not tokenize on whitespace, which matters for huge inputs."""
+    return s if len(s) <= n else s[:n - 1] + "…"
+
 def make_response(status_code: int, body_obj: dict, origin: str = None):
     """Return Netlify-compatible lambda response with CORS headers."""
-    headers = {
-        "Content-Type": "application/json"
-    }
+    headers = _BASE_HEADERS.copy()
     # Allow explicit origin if provided; otherwise allow all (use ALLOWED_ORIGINS for production)
-    if origin:
-        headers["Access-Control-Allow-Origin"] = origin
-    else:
-        headers["Access-Control-Allow-Origin"] = "*"
-    headers["Access-Control-Allow-Methods"] = "GET, POST, OPTIONS"
-    headers["Access-Control-Allow-Headers"] = "Content-Type, Authorization"
+    headers["Access-Control-Allow-Origin"] = origin or "*"
     return {
         "statusCode": status_code,
         "headers": headers,
-        "body": json.dumps(body_obj, ensure_ascii=False)
+        "body": orjson.dumps(body_obj).decode()
     }
 
 def summarize(resp_json):
     """Create a short human-readable summary from the expected response structure."""
     if not isinstance(resp_json, dict):
-        return textwrap.shorten(str(resp_json), width=2000, placeholder="…")
+        return _cap(str(resp_json))
 
     # Upstream error case
-    if "Error code" in resp_json:
-        err = resp_json.get("Error code")
+    err = resp_json.get("Error code")
+    if err is not None:
         msg = resp_json.get("Description") or resp_json.get("message") or ""
         return f"API Error: {err}. {msg}"
 
     # Typical response path: "List" -> DB sections -> Data arrays
-    if "List" in resp_json and isinstance(resp_json["List"], dict):
+    list_obj = resp_json.get("List")
+    if isinstance(list_obj, dict):
+        if not list_obj:
+            return ""
         parts = []
-        for dbname, dbinfo in resp_json["List"].items():
-            parts.append(f"== {dbname} ==")
-            info_leak = dbinfo.get("InfoLeak") or dbinfo.get("info") or ""
+        # bind hot names to locals: LOAD_FAST beats LOAD_GLOBAL/LOAD_ATTR
+        # inside these loops
+        _append = parts.append
+        _str = str
+        _len = len
+        _isinstance = isinstance
+        for dbname, dbinfo in list_obj.items():
+            _append(f"== {dbname} ==")
+            dbinfo_get = dbinfo.get
+            info_leak = dbinfo_get("InfoLeak") or dbinfo_get("info") or ""
             if info_leak:
-                parts.append(f"Summary: {info_leak}")
-            data = dbinfo.get("Data") or []
-            parts.append(f"Entries: {len(data)}")
-            # show up to 3 entries
+                _append(f"Summary: {info_leak}")
+            data = dbinfo_get("Data") or ()
+            _append(f"Entries: {_len(data)}")
+            # show up to 3 entries; one join per entry instead of one
+            # append + f-string per field keeps the buffer small
             for i, entry in enumerate(data[:3], 1):
-                parts.append(f" Entry {i}:")
-                if isinstance(entry, dict):
-                    for k, v in entry.items():
-                        s = str(v)
-                        if len(s) > 200:
-                            s = s[:200] + "…"
-                        parts.append(f"  {k}: {s}")
+                _append(f" Entry {i}:")
+                if _isinstance(entry, dict):
+                    block = "\n".join(
+                        f"  {k}: {s if _len(s) <= 200 else s[:200] + '…'}"
+                        for k, s in ((k, v if _isinstance(v, str) else _str(v)) for k, v in entry.items())
+                    )
+                    # empty dict -> empty block; appending it would inject
+                    # a stray blank line the old per-field loop never made
+                    if block:
+                        _append(block)
                 else:
-                    parts.append(f"  {str(entry)}")
-            if len(data) > 3:
-                parts.append(f"...and {len(data)-3} more entries")
-            parts.append("")  # blank line between DBs
+                    _append(f"  {_str(entry)}")
+            if _len(data) > 3:
+                _append(f"...and {_len(data)-3} more entries")
+            _append("")  # blank line between DBs
         return "\n".join(parts).strip()
 
     # fallback
-    return textwrap.shorten(str(resp_json), width=2000, placeholder="…")
+    return _cap(str(resp_json))
+
+def _shape(result, include_raw, include_summary):
+    """Project a cached {raw, summary} record onto the fields the caller asked for."""
+    if include_raw and include_summary:
+        return result
+    out = {}
+    if include_raw:
+        out["raw"] = result["raw"]
+    if include_summary:
+        out["summary"] = result.get("summary", "")
+    return out
+
+def _execute(query, limit, lang, include_raw, include_summary):
+    """Run one query through the trivial-input, cache and upstream pipeline.
+
+    Returns (status_code, body_dict); the caller applies make_response.
+    """
+    # Inputs that cannot match anything skip the network entirely and
+    # get a canned zero-hit reply.
+    if _is_trivial(query):
+        return 200, _shape({"raw": _EMPTY_RESULT, "summary": ""}, include_raw, include_summary)
+
+    # Serve repeat queries from cache while the container is warm;
+    # skips the upstream round-trip and the billable call entirely.
+    cache_key = _cache_key(query, limit, lang)
+    with _CACHE_LOCK:
+        cached = _CACHE.get(cache_key) or _NEGATIVE_CACHE.get(cache_key)
+    if cached is not None:
+        if include_summary and "summary" not in cached:
+            # earlier caller skipped the summary; fill it in once, built
+            # outside the lock so batch threads' lookups aren't blocked
+            summary = summarize(cached["raw"])
+            with _CACHE_LOCK:
+                cached.setdefault("summary", summary)
+        return 200, _shape(cached, include_raw, include_summary)
+
+    # Always ask upstream for JSON; summarize() and the cache assume it.
+    upstream_payload = {
+        "token": _TOKEN,
+        "request": query,
+        "limit": limit,
+        "lang": lang,
+        "type": "json"
+    }
+
+    # Call upstream API
+    try:
+        resp = SESSION.post(API_URL, json=upstream_payload, timeout=30)
+    except requests.RequestException as e:
+        return 502, {"error": "Upstream request failed", "detail": str(e)}
+
+    if not resp.ok:
+        # Keep error info minimal; avoid leaking headers/token content
+        text = resp.text
+        truncated = text if len(text) <= 1000 else text[:1000] + "…"
+        return 502, {"error": "Upstream returned non-200", "status_code": resp.status_code, "text": truncated}
+
+    try:
+        resp_json = orjson.loads(resp.content)
+    except Exception:
+        # upstream returned non-JSON
+        raw_text = resp.text
+        return 200, {"raw": raw_text, "summary": _cap(raw_text)}
+
+    # Build summary once and cache it alongside the raw payload so
+    # repeat requests skip both the network and the summarization.
+    result = {"raw": resp_json}
+    if include_summary:
+        result["summary"] = summarize(resp_json)
+    # Upstream error bodies (rate limits, token/balance failures) are
+    # transient and must not be cached at all. True zero-hit answers —
+    # "List" present and empty — go to the long-TTL tier; they rarely change.
+    is_dict = isinstance(resp_json, dict)
+    if not (is_dict and "Error code" in resp_json):
+        is_empty = is_dict and "List" in resp_json and not resp_json["List"]
+        with _CACHE_LOCK:
+            (_NEGATIVE_CACHE if is_empty else _CACHE)[cache_key] = result
+    return 200, _shape(result, include_raw, include_summary)
 
 def handler(event, context):
     try:
         # Preflight CORS support
         if event.get("httpMethod") == "OPTIONS":
-            return make_response(200, {"ok": True})
+            return _PREFLIGHT_RESPONSE
 
         # Allowed origin for CORS (optional). Set ALLOWED_ORIGINS in Netlify env to restrict.
-        allowed_origins = os.getenv("ALLOWED_ORIGINS", "").strip()
-        allowed_origin = None
-        if allowed_origins:
-            # take first origin if multiple provided
-            allowed_origin = allowed_origins.split(",")[0].strip()
+        allowed_origin = _ALLOWED_ORIGIN
 
-        # Get token from environment (must be set in Netlify site settings)
-        token = os.getenv("LEAK_API_TOKEN")
-        if not token:
-            return make_response(500, {"error": "Server misconfiguration: missing LEAK_API_TOKEN"}, allowed_origin)
+        # Token must be set in Netlify site settings
+        if not _TOKEN:
+            return _MISCONFIG_RESPONSE
 
         # Parse body
         raw_body = event.get("body") or ""
         try:
-            payload = json.loads(raw_body)
+            payload = orjson.loads(raw_body)
         except Exception:
             return make_response(400, {"error": "Invalid JSON. Expected application/json with 'query' field."}, allowed_origin)
 
         query = payload.get("query") or payload.get("request")
-        if not query:
+        queries = payload.get("queries")
+        if not query and not queries:
             return make_response(400, {"error": "Missing 'query' field in request body."}, allowed_origin)
 
-        # Build upstream payload
         limit = int(payload.get("limit", 100))
         lang = payload.get("lang", "en")
-        out_type = payload.get("type", "json")
-
-        upstream_payload = {
-            "token": token,
-            "request": str(query),
-            "limit": limit,
-            "lang": lang,
-            "type": out_type
-        }
-
-        # Call upstream API
-        try:
-            resp = requests.post(API_URL, json=upstream_payload, timeout=30)
-        except requests.RequestException as e:
-            return make_response(502, {"error": "Upstream request failed", "detail": str(e)}, allowed_origin)
+        # Clients that only consume `raw` can skip summary generation, and
+        # summary-only clients can drop the (much larger) raw payload from
+        # the response body with include_raw=false.
+        include_summary = bool(payload.get("include_summary", True))
+        include_raw = bool(payload.get("include_raw", True))
 
-        if not resp.ok:
-            # Keep error info minimal; avoid leaking headers/token content
-            text = resp.text
-            truncated = text if len(text) <= 1000 else text[:1000] + "…"
-            return make_response(502, {"error": "Upstream returned non-200", "status_code": resp.status_code, "text": truncated}, allowed_origin)
-
-        try:
-            resp_json = resp.json()
-        except Exception:
-            # upstream returned non-JSON
-            raw_text = resp.text
-            return make_response(200, {"raw": raw_text, "summary": textwrap.shorten(raw_text, width=2000)}, allowed_origin)
+        # Batch mode: fan the queries out across the pool so N upstream
+        # calls finish in roughly max(latency) instead of sum(latency).
+        if queries is not None:
+            if not isinstance(queries, list) or not queries:
+                return make_response(400, {"error": "'queries' must be a non-empty list."}, allowed_origin)
+            if len(queries) > _MAX_BATCH:
+                return make_response(400, {"error": f"'queries' accepts at most {_MAX_BATCH} entries."}, allowed_origin)
+            futures = [
+                _BATCH_POOL.submit(_execute, str(q), limit, lang, include_raw, include_summary)
+                for q in queries
+            ]
+            results = []
+            for q, future in zip(queries, futures):
+                try:
+                    _, body = future.result()
+                except Exception as e:
+                    body = {"error": str(e)}
+                results.append({"query": str(q), **body})
+            return make_response(200, {"results": results}, allowed_origin)
 
-        # Build summary and return both raw and summary
-        summary = summarize(resp_json)
-        return make_response(200, {"raw": resp_json, "summary": summary}, allowed_origin)
+        status_code, body = _execute(str(query), limit, lang, include_raw, include_summary)
+        return make_response(status_code, body, allowed_origin)
 
     except Exception as e:
         # Catch-all for any unhandled errors, always return valid JSON
-        return make_response(
-            500,
-            {"error": "Internal server error", "detail": str(e)},
-            os.getenv("ALLOWED_ORIGINS", "").split(",")[0].strip() if os.getenv("ALLOWED_ORIGINS", "").strip() else "*"
-        )
+        return make_response(500, {"error": "Internal server error", "detail": str(e)}, _ALLOWED_ORIGIN)